@@ -1,13 +1,18 @@
 from __future__ import annotations
 
+import argparse
 import os
+import sys
 from time import sleep
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, List
 
 import openpyxl
 import pyautogui
 import pyperclip
 
+from chart_storage import chart_path, open_chart
+from mrn_sheet import get_mrns
+
 if TYPE_CHECKING:
     from openpyxl.worksheet.worksheet import Worksheet
 
@@ -16,6 +21,12 @@ COPY = "c"
 PASTE = "v"
 SELECT_ALL = "a"
 
+# the EMR is driven from a Mac, but sessions on virtual X displays need ctrl
+MODIFIER = "command" if sys.platform == "darwin" else "ctrl"
+
+# scales every pause, lets the local fake EMR harness run faster than the real thing
+PAUSE_SCALE = float(os.environ.get("AUTOGREP_PAUSE_SCALE", "1.0"))
+
 
 class AutoGrepException(Exception):
     pass
@@ -31,13 +42,15 @@ def get_worksheet(input_file: str) -> Worksheet:
 
 
 def do_work(worksheet: Worksheet):
-    # Grab the patient's MRN from the master Excel sheet, and copy to the clipboard
-    for cell_index in range(4, 28):
-        cell = worksheet[f"A{cell_index}"]
-        value = cell.value
+    pull_charts(get_mrns(worksheet))
+
+
+def pull_charts(mrns: List[str]):
+    # Grab each patient's MRN, and copy to the clipboard
+    for number, value in enumerate(mrns, start=1):
         pyperclip.copy(value)
-        print(f"Working on patient MRN {value}, number {cell_index}")
-        sleep(0.1)
+        print(f"Working on patient MRN {value}, number {number}")
+        _sleep(0.1)
 
         # ---------------------------------------------
         # Paste the MRN into the EMR search bar, and navigate to the patient's chart
@@ -80,34 +93,46 @@ def do_work(worksheet: Worksheet):
             _move_and_click(x, y, duration=duration, s1=s1, s2=s2)
 
         # ---------------------------------------
-        # This copies the entire encounter history into a new text doc,
+        # This copies the entire encounter history into a new (compressed) text doc,
         # and saves it to your current working directory, titled with the MRN
         _hotkey_command(SELECT_ALL, s1=0.5)
         _hotkey_command(COPY, s1=0.5)
 
         clipboard_content = pyperclip.paste()
-        with open(f"{value}.txt", "w") as file:
+        with open_chart(chart_path(value), "w") as file:
             file.write(clipboard_content)
-        sleep(0.5)
+        _sleep(0.5)
 
         _hotkey_command(CLOSE, s1=1.0)
 
 
 def _hotkey_command(command: str, s1=0.0):
-    pyautogui.hotkey("command", command)
-    sleep(s1)
+    pyautogui.hotkey(MODIFIER, command)
+    _sleep(s1)
 
 
 def _move_and_click(x, y, duration=0.0, s1=0.0, s2=0.0):
-    pyautogui.moveTo(x, y, duration=duration)
-    sleep(s1)
+    pyautogui.moveTo(x, y, duration=duration * PAUSE_SCALE)
+    _sleep(s1)
     pyautogui.click()
-    sleep(s2)
+    _sleep(s2)
+
+
+def _sleep(seconds: float):
+    sleep(seconds * PAUSE_SCALE)
 
 
 if __name__ == "__main__":
-    sleep(5)  # gives me 5 seconds to navigate to my browser window
-    ws = get_worksheet("input.xlsx")
-    do_work(ws)
+    parser = argparse.ArgumentParser(description="Copy patient charts out of the EMR.")
+    parser.add_argument("mrns", nargs="*", help="MRNs to pull, defaults to the ones in input.xlsx")
+    parser.add_argument("--input", default="input.xlsx", help="master Excel sheet of MRNs")
+    args = parser.parse_args()
+
+    if args.mrns:
+        mrns = args.mrns
+    else:
+        sleep(5)  # gives me 5 seconds to navigate to my browser window
+        mrns = get_mrns(get_worksheet(args.input))
+    pull_charts(mrns)
 
     print("DONE")
@@ -0,0 +1,151 @@
+"""Runs several autogrep_emr sessions at once, each on its own virtual X display (Xvfb).
+
+Every display has its own mouse, keyboard focus, and clipboard, so the sessions can't
+step on each other.  The MRNs are split between the sessions round-robin."""
+import argparse
+import os
+import select
+import subprocess
+import sys
+import time
+from typing import List, Optional
+
+from chart_storage import chart_path
+from mrn_sheet import read_mrns
+
+DISPLAY_SIZE = "1440x900x24"  # the clicks in autogrep_emr are specific to this size
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+class AutoGrepSessionException(Exception):
+    pass
+
+
+def split_mrns(mrns: List[str], sessions: int) -> List[List[str]]:
+    """Splits the MRNs round-robin between the sessions, leaving out sessions with nothing to do."""
+    if sessions < 1:
+        raise AutoGrepSessionException(f"Need at least one session, not {sessions}")
+    return [chunk for chunk in (mrns[i::sessions] for i in range(sessions)) if chunk]
+
+
+class VirtualDisplay:
+    """Starts an Xvfb server, on whichever display is free, on enter and stops it on exit."""
+
+    def __init__(self, timeout: float = 10.0):
+        self.timeout = timeout
+        self.name = ""
+        self.process: Optional[subprocess.Popen] = None
+
+    def env(self) -> dict:
+        env = dict(os.environ)
+        env["DISPLAY"] = self.name
+        return env
+
+    def __enter__(self) -> "VirtualDisplay":
+        # Xvfb picks a free display and writes its number to the pipe once it is ready
+        read_fd, write_fd = os.pipe()
+        try:
+            try:
+                self.process = subprocess.Popen(
+                    ["Xvfb", "-displayfd", str(write_fd), "-screen", "0", DISPLAY_SIZE, "-nolisten", "tcp"],
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
+                    pass_fds=(write_fd,),
+                )
+            finally:
+                os.close(write_fd)
+            number = self._read_display_number(read_fd)
+        finally:
+            os.close(read_fd)
+        if not number:
+            self.__exit__(None, None, None)
+            raise AutoGrepSessionException("Xvfb didn't start")
+        self.name = f":{number}"
+        return self
+
+    def _read_display_number(self, read_fd: int) -> str:
+        output = b""
+        deadline = time.monotonic() + self.timeout
+        while not output.endswith(b"\n"):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([read_fd], [], [], remaining)[0]:
+                return ""
+            data = os.read(read_fd, 16)
+            if not data:  # Xvfb exited
+                return ""
+            output += data
+        return output.decode().strip()
+
+    def __exit__(self, *exc):
+        if self.process is not None:
+            self.process.terminate()
+            self.process.wait()
+            self.process = None
+
+
+def run_sessions(
+    mrns: List[str],
+    sessions: int,
+    emr_command: Optional[List[str]] = None,
+    pause_scale: float = 1.0,
+    output_dir: Optional[str] = None,
+) -> float:
+    """Pulls the charts for the MRNs across the sessions and returns how long it took in seconds.
+    If given, emr_command is started on each display first (e.g. the EMR client, or fake_emr.py).
+    The charts are saved to output_dir, the current directory by default."""
+    chunks = split_mrns(mrns, sessions)
+    displays = [VirtualDisplay() for _ in chunks]
+    emrs: List[subprocess.Popen] = []
+    workers: List[subprocess.Popen] = []
+
+    start = time.monotonic()
+    try:
+        for display in displays:
+            display.__enter__()
+
+        if emr_command:
+            emrs = [subprocess.Popen(emr_command, env=display.env()) for display in displays]
+            time.sleep(1.0)  # give the EMR windows a moment to map
+
+        for display, chunk in zip(displays, chunks):
+            env = display.env()
+            env["AUTOGREP_PAUSE_SCALE"] = str(pause_scale)
+            command = [sys.executable, os.path.join(HERE, "autogrep_emr.py"), *chunk]
+            workers.append(subprocess.Popen(command, env=env, cwd=output_dir))
+
+        failed = [worker.args for worker in workers if worker.wait() != 0]
+        if failed:
+            raise AutoGrepSessionException(f"{len(failed)} session(s) failed: {failed}")
+    finally:
+        for process in workers + emrs:
+            if process.poll() is None:
+                process.terminate()
+                process.wait()
+        for display in displays:
+            display.__exit__(None, None, None)
+
+    return time.monotonic() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pull charts with several sessions on virtual displays.")
+    parser.add_argument("--sessions", type=int, default=2, help="number of virtual displays to run")
+    parser.add_argument("--input", default="input.xlsx", help="master Excel sheet of MRNs")
+    parser.add_argument("--emr-command", help="command that opens the EMR on a display")
+    parser.add_argument("--fake-emr", type=int, metavar="COUNT", help="benchmark against fake_emr.py with COUNT charts")
+    parser.add_argument("--pause-scale", type=float, default=1.0, help="scales every pause in autogrep_emr")
+    args = parser.parse_args()
+
+    if args.fake_emr:
+        mrns = [f"{100000 + i}" for i in range(args.fake_emr)]
+        emr_command = [sys.executable, os.path.join(HERE, "fake_emr.py")]
+    else:
+        mrns = read_mrns(args.input)
+        emr_command = args.emr_command.split() if args.emr_command else None
+
+    elapsed = run_sessions(mrns, args.sessions, emr_command=emr_command, pause_scale=args.pause_scale)
+    missing = [mrn for mrn in mrns if not os.path.exists(chart_path(mrn))]
+    if missing:
+        print(f"Missing charts for MRNs: {', '.join(missing)}")
+    print(f"Pulled {len(mrns) - len(missing)} charts with {args.sessions} session(s) in {elapsed:.1f}s "
+          f"({len(mrns) / elapsed * 60:.1f} charts/min)")
@@ -0,0 +1,116 @@
+"""Keeps one pathological chart from stalling a whole batch.
+
+Clipboard dumps sometimes hold enormous single lines or pasted tables, which some of the
+patterns in read_patient_data get very slow on.  A running regex can't be interrupted, so
+the guard bounds the work up front instead: over-long lines are cut down to a size the
+patterns can scan quickly, over-long charts aren't read past the limit, and the time spent
+on a chart is checked between extractors, and before every row of visits with long lines.
+Charts over budget are quarantined, i.e. skipped.  Everything the guard does is recorded,
+with the MRN, in events."""
+import math
+import time
+from typing import IO, Iterator, List, NamedTuple
+
+
+# rows shorter than this are quick for every pattern, visits made of only such rows
+# aren't watched row by row (the clock is still checked between extractors)
+SLOW_ROW_CHARS = 256
+
+
+class ChartQuarantined(Exception):
+    pass
+
+
+class GuardEvent(NamedTuple):
+    mrn: str
+    event: str
+    detail: str
+
+
+class ChartGuard:
+    """Per chart budgets: seconds spent parsing, characters in the chart, and characters per line."""
+
+    def __init__(
+        self,
+        max_seconds: float = 5.0,
+        max_chars: float = 5_000_000,
+        max_line_chars: float = 2_000,
+    ):
+        self.max_seconds = max_seconds
+        self.max_chars = max_chars
+        self.max_line_chars = max_line_chars
+        self.events: List[GuardEvent] = []
+
+    @classmethod
+    def unlimited(cls) -> "ChartGuard":
+        return cls(max_seconds=math.inf, max_chars=math.inf, max_line_chars=math.inf)
+
+    def fresh(self) -> "ChartGuard":
+        """Returns a guard with the same budgets and no events, e.g. to send to a worker."""
+        return ChartGuard(self.max_seconds, self.max_chars, self.max_line_chars)
+
+    def record(self, mrn: str, event: str, detail: str = ""):
+        self.events.append(GuardEvent(mrn, event, detail))
+
+    def quarantine(self, mrn: str, reason: str):
+        self.record(mrn, "quarantined", reason)
+        raise ChartQuarantined(f"{mrn}: {reason}")
+
+    def read(self, mrn: str, handle: IO[str]) -> str:
+        """Reads a chart, but not past max_chars."""
+        if self.max_chars == math.inf:
+            return handle.read()
+        text = handle.read(int(self.max_chars) + 1)
+        self.check_size(mrn, text)
+        return text
+
+    def check_size(self, mrn: str, text: str):
+        if len(text) > self.max_chars:
+            self.quarantine(mrn, f"chart is over {self.max_chars} characters")
+
+    def bound_lines(self, mrn: str, lines: List[str]) -> List[str]:
+        """Returns the lines with any over max_line_chars cut down to that length."""
+        if self.max_line_chars == math.inf:
+            return lines
+        limit = int(self.max_line_chars)
+        if max(map(len, lines), default=0) <= limit:
+            return lines
+        bounded = []
+        for number, line in enumerate(lines, start=1):
+            if len(line) > limit:
+                self.record(mrn, "line truncated", f"line {number} had {len(line)} characters")
+                line = line[:limit]  # keep the start, that's where the labels are
+            bounded.append(line)
+        return bounded
+
+    def watch(self, mrn: str, encounters: List[List[str]], started: float) -> List[List[str]]:
+        """Returns the encounters with each visit that has a long row checking the time budget
+        before handing out a row, so no extractor can run much past max_seconds. Other visits
+        are left as they are, so ordinary charts don't pay for the checks."""
+        if self.max_seconds == math.inf:
+            return encounters
+        return [
+            _WatchedVisit(visit, self, mrn, started)
+            if max(map(len, visit), default=0) > SLOW_ROW_CHARS
+            else visit
+            for visit in encounters
+        ]
+
+    def check_time(self, mrn: str, started: float, step: str):
+        """Quarantines the chart if more than max_seconds have passed since started (perf_counter)."""
+        elapsed = time.perf_counter() - started
+        if elapsed > self.max_seconds:
+            self.quarantine(mrn, f"over {self.max_seconds}s budget ({elapsed:.2f}s) after {step}")
+
+
+class _WatchedVisit(list):
+    def __init__(self, rows: List[str], guard: ChartGuard, mrn: str, started: float):
+        super().__init__(rows)
+        self.guard = guard
+        self.mrn = mrn
+        self.started = started
+
+    def __iter__(self) -> Iterator[str]:
+        for row in super().__iter__():
+            self.guard.check_time(self.mrn, self.started, "scanning rows")
+            yield row
@@ -0,0 +1,129 @@
+"""Reading and writing saved charts, compressed or not.
+
+Charts are mostly repeated boilerplate, so they are saved compressed with the best
+codec available (zstd, then gzip).  Reading picks the codec from the file extension
+and decompresses as it streams, so nothing is unpacked to disk first.  The same goes
+for charts shipped inside zip or tar archives."""
+import bz2
+import functools
+import gzip
+import io
+import lzma
+import os
+import tarfile
+import zipfile
+from typing import IO, Callable, Dict, Iterator, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # optional, gzip is always available
+    zstandard = None
+
+PLAIN = ".txt"
+SUFFIXES = (".txt.zst", ".txt.gz", ".txt.xz", ".txt.bz2", PLAIN)
+
+_OPENERS: Dict[str, Callable[..., IO]] = {
+    PLAIN: open,
+    ".txt.gz": gzip.open,
+    ".txt.xz": lzma.open,
+    ".txt.bz2": bz2.open,
+}
+if zstandard is not None:
+    _OPENERS[".txt.zst"] = zstandard.open
+
+# charts are written with this extension
+CHART_SUFFIX = ".txt.zst" if zstandard is not None else ".txt.gz"
+
+ARCHIVES = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.xz", ".tar.bz2")
+
+# (name, opener) - the chart is only opened, as text, when the opener is called
+ChartSource = Tuple[str, Callable[[], IO[str]]]
+
+
+def _suffix(path: str) -> str:
+    name = os.path.basename(path)
+    for suffix in SUFFIXES:
+        if name.endswith(suffix):
+            return suffix
+    return ""
+
+
+def is_chart(path: str) -> bool:
+    """True if the path looks like a saved chart this module can read."""
+    return _suffix(path) in _OPENERS
+
+
+def chart_mrn(path: str) -> str:
+    """Returns the MRN a chart was saved under, e.g. '123.txt.gz' -> '123'."""
+    name = os.path.basename(path)
+    suffix = _suffix(name)
+    return name[: -len(suffix)] if suffix else os.path.splitext(name)[0]
+
+
+def chart_path(mrn: str, suffix: str = CHART_SUFFIX) -> str:
+    """Returns the file name to save the MRN's chart to."""
+    return f"{mrn}{suffix}"
+
+
+def open_chart(path: str, mode: str = "r", fileobj: Optional[IO[bytes]] = None) -> IO[str]:
+    """Opens a chart as text ('r' or 'w'), compressing or decompressing based on its extension.
+    If fileobj is given, the chart is read from it instead, with path only naming the chart."""
+    suffix = _suffix(path)
+    if suffix not in _OPENERS:
+        hint = " (pip install zstandard)" if suffix == ".txt.zst" else ""
+        raise ValueError(f"Can't open chart: {path}{hint}")
+    opener = _OPENERS[suffix]
+    if fileobj is None:
+        return opener(path, mode if opener is open else f"{mode}t")
+    if opener is open:
+        return io.TextIOWrapper(fileobj)
+    return opener(fileobj, f"{mode}t")
+
+
+def is_archive(path: str) -> bool:
+    """True if the path is a zip or tar archive that may contain charts."""
+    return path.endswith(ARCHIVES) and os.path.isfile(path)
+
+
+def iter_charts(path: str) -> Iterator[ChartSource]:
+    """Yields the charts in a directory, an archive, or the chart itself, in that order of checking.
+    Archive members are streamed, each one has to be read before moving on to the next.
+    Raises ValueError if the path is none of these."""
+    if os.path.isdir(path):
+        for file in os.listdir(path):
+            if is_chart(file):
+                yield file, functools.partial(open_chart, os.path.join(path, file))
+    elif is_archive(path) and path.endswith(".zip"):
+        yield from _iter_zip(path)
+    elif is_archive(path):
+        yield from _iter_tar(path)
+    elif is_chart(path) and os.path.isfile(path):
+        yield path, functools.partial(open_chart, path)
+    else:
+        raise ValueError(f"Not a directory, archive, or chart: {path}")
+
+
+def _iter_zip(path: str) -> Iterator[ChartSource]:
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            if not info.is_dir() and is_chart(info.filename):
+                member = functools.partial(archive.open, info)
+                yield info.filename, functools.partial(_open_member, info.filename, member)
+
+
+def _iter_tar(path: str) -> Iterator[ChartSource]:
+    # "r|*" reads the archive front to back without seeking, whatever its compression
+    with tarfile.open(path, "r|*") as archive:
+        for member in archive:
+            if member.isfile() and is_chart(member.name):
+                extract = functools.partial(_extract_member, archive, member)
+                yield member.name, functools.partial(_open_member, member.name, extract)
+
+
+def _extract_member(archive: tarfile.TarFile, member: tarfile.TarInfo) -> IO[bytes]:
+    # members of a streamed tar can't seek, which the text/codec readers expect
+    return io.BytesIO(archive.extractfile(member).read())
+
+
+def _open_member(name: str, member: Callable[[], IO[bytes]]) -> IO[str]:
+    return open_chart(name, fileobj=member())
@@ -0,0 +1,199 @@
+"""Cohort level summaries, updated one datasheet at a time.
+
+Every accumulator here can be merged with another of its kind, so workers can each keep
+their own and combine them at the end.  Memory stays bounded no matter how many charts
+are processed: numbers keep a running mean/variance and a log-bucketed quantile sketch
+(in the spirit of DDSketch) instead of every value, and free text answers are counted by
+a fixed size space-saving summary that keeps the most frequent ones."""
+import math
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# zero means "not found in the chart" for all of these, so zeros are left out
+NUMERIC_FIELDS = (
+    "Intake BMI",
+    "Max BMI",
+    "Min BMI",
+    "Latest A1c%",
+    "Latest Fasting Glucose",
+)
+COUNTED_FIELDS = ("Smoker", "Insurance")
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+
+def a1c_bucket(a1c: float) -> str:
+    """Returns the diagnostic bucket for an A1c reading (in %)."""
+    if a1c <= 0:
+        return "Not Recorded"
+    if a1c < 5.7:
+        return "Normal (<5.7)"
+    if a1c < 6.5:
+        return "Prediabetes (5.7-6.4)"
+    return "Diabetes (>=6.5)"
+
+
+class RunningStats:
+    """Count, mean and variance without keeping the values (Welford, merged with Chan et al.)."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other: "RunningStats"):
+        if other.count == 0:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self._m2 += other._m2 + delta**2 * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def variance(self) -> float:
+        """Sample variance, 0.0 until there are two values."""
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+
+class QuantileSketch:
+    """Approximate quantiles of positive values; any answer is within relative_accuracy
+    of a true value. Values are counted in logarithmic buckets, so the number of buckets
+    only grows with the range of the values, not how many there are."""
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.relative_accuracy = relative_accuracy
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self.buckets: Counter = Counter()
+        self.count = 0
+
+    def add(self, value: float):
+        if value <= 0:
+            raise ValueError(f"QuantileSketch only takes positive values, not {value}")
+        self.buckets[math.ceil(math.log(value) / self._log_gamma)] += 1
+        self.count += 1
+
+    def merge(self, other: "QuantileSketch"):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Can't merge sketches with different accuracies")
+        self.buckets.update(other.buckets)
+        self.count += other.count
+
+    def quantile(self, q: float) -> float:
+        """Returns the approximate q-quantile (0 <= q <= 1), 0.0 if nothing was added."""
+        if self.count == 0:
+            return 0.0
+        rank = q * (self.count - 1)
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                break
+        return 2 * self._gamma**index / (self._gamma + 1)
+
+
+class TopCounter:
+    """Approximate counts of the most frequent values, never holding more than capacity of them
+    (space-saving, Metwally et al.). A value seen more than 1/capacity of the time is always
+    kept, and its count is over by at most the smallest count kept."""
+
+    def __init__(self, capacity: int = 100):
+        self.capacity = capacity
+        self.counts: Dict[str, int] = {}
+
+    def add(self, value: str, count: int = 1):
+        if value in self.counts or len(self.counts) < self.capacity:
+            self.counts[value] = self.counts.get(value, 0) + count
+            return
+        # replace the least frequent value, the newcomer inherits its count
+        smallest = min(self.counts, key=self.counts.__getitem__)
+        self.counts[value] = self.counts.pop(smallest) + count
+
+    def update(self, values: Iterable[str]):
+        for value in values:
+            self.add(value)
+
+    def merge(self, other: "TopCounter"):
+        # a value missing from a full summary may have been evicted from it, so it is
+        # credited with that summary's smallest count, keeping counts over, never under
+        missing_self = self._floor()
+        missing_other = other._floor()
+        merged = {}
+        for value in set(self.counts) | set(other.counts):
+            merged[value] = self.counts.get(value, missing_self) + other.counts.get(value, missing_other)
+        self.counts = dict(Counter(merged).most_common(self.capacity))
+
+    def _floor(self) -> int:
+        # the most a value not held here could have been seen
+        return min(self.counts.values()) if len(self.counts) >= self.capacity else 0
+
+    def most_common(self, n: Optional[int] = None) -> List[Tuple[str, int]]:
+        return Counter(self.counts).most_common(n)
+
+
+class CohortStats:
+    """Summary statistics for all the datasheets it has been given."""
+
+    def __init__(self, relative_accuracy: float = 0.01, capacity: int = 100):
+        self.patients = 0
+        self.numbers: Dict[str, RunningStats] = {f: RunningStats() for f in NUMERIC_FIELDS}
+        self.sketches: Dict[str, QuantileSketch] = {
+            f: QuantileSketch(relative_accuracy) for f in NUMERIC_FIELDS
+        }
+        self.counts: Dict[str, TopCounter] = {f: TopCounter(capacity) for f in COUNTED_FIELDS}
+        self.a1c_buckets: Counter = Counter()  # a fixed set of buckets
+        self.comorbidities = TopCounter(capacity)
+
+    def update(self, datasheet: dict):
+        self.patients += 1
+        for field in NUMERIC_FIELDS:
+            value = datasheet.get(field) or 0.0
+            if value > 0:
+                self.numbers[field].add(value)
+                self.sketches[field].add(value)
+        for field in COUNTED_FIELDS:
+            self.counts[field].add(datasheet.get(field) or "Not Recorded")
+        self.a1c_buckets[a1c_bucket(datasheet.get("Latest A1c%") or 0.0)] += 1
+        comorbidities = datasheet.get("Comorbidity") or ""
+        self.comorbidities.update(c for c in comorbidities.split(";") if c)
+
+    def merge(self, other: "CohortStats"):
+        self.patients += other.patients
+        for field in NUMERIC_FIELDS:
+            self.numbers[field].merge(other.numbers[field])
+            self.sketches[field].merge(other.sketches[field])
+        for field in COUNTED_FIELDS:
+            self.counts[field].merge(other.counts[field])
+        self.a1c_buckets.update(other.a1c_buckets)
+        self.comorbidities.merge(other.comorbidities)
+
+    def summary(self, top: Optional[int] = None) -> dict:
+        """Returns the summary as a (JSON friendly) dictionary, top limits the counted values."""
+        summary = {"Patients": self.patients}
+        for field in NUMERIC_FIELDS:
+            stats, sketch = self.numbers[field], self.sketches[field]
+            summary[field] = {
+                "Count": stats.count,
+                "Mean": round(stats.mean, 2),
+                "StdDev": round(math.sqrt(stats.variance), 2),
+                "Min": stats.min if stats.count else 0.0,
+                "Max": stats.max if stats.count else 0.0,
+                **{f"P{round(q * 100)}": round(sketch.quantile(q), 1) for q in QUANTILES},
+            }
+        for field in COUNTED_FIELDS:
+            summary[field] = dict(self.counts[field].most_common(top))
+        summary["A1c Buckets"] = dict(self.a1c_buckets.most_common())
+        summary["Comorbidity"] = dict(self.comorbidities.most_common(top))
+        return summary
@@ -0,0 +1,116 @@
+"""A local stand-in for the EMR, laid out so that autogrep_emr's clicks land where they
+would on the real thing (1,440 x 900). It serves synthetic charts, so the chart pulling
+can be tested and benchmarked on a headless box, one instance per virtual display."""
+import argparse
+import random
+import tkinter as tk
+from typing import List
+
+WIDTH = 1440
+HEIGHT = 900
+
+INSURANCES = ["Blue Cross", "Aetna", "Medicare", "Self Pay"]
+SMOKERS = ["never", "former", "current"]
+MEDICATIONS = ["ozempic", "vyvanse", "succenda"]
+COMORBIDITIES = ["Hypertension", "Type 2 Diabetes", "Sleep Apnea", "GERD", "Osteoarthritis"]
+BOILERPLATE = [
+    "Patient was seen in clinic today and counselled on diet and exercise.",
+    "Reviewed medication list and allergies with the patient.",
+    "Follow up in three months or sooner if needed.",
+]
+
+
+def synthetic_chart(mrn: str, visits: int = 4) -> str:
+    """Returns a made up encounter history for the MRN, the same MRN always gets the same chart."""
+    rng = random.Random(mrn)
+    height = rng.randint(150, 195)
+    intake_weight = rng.randint(200, 400)
+    smoker = rng.choice(SMOKERS)
+    insurance = rng.choice(INSURANCES)
+    comorbidities = rng.sample(COMORBIDITIES, rng.randint(1, 3))
+
+    lines: List[str] = []
+    for visit in range(visits):
+        # most recent visit first, like the EMR
+        weight = intake_weight - (visits - 1 - visit) * rng.randint(0, 10)
+        lines += [
+            f"ID: {mrn}-{visits - visit}",
+            f"Visit Date: 2023-{12 - visit:02d}-{rng.randint(1, 28):02d}",
+            f"Today's Weight: {weight} lbs",
+            f"Peak Adult Weight: {intake_weight + 20} lbs",
+            f"Intake Weight: {intake_weight} lbs",
+            f"Height: {height}cm",
+            f"Smoker: - {smoker}",
+            f"Insurance: {insurance}",
+            f"Fasting Glucose: {rng.randint(40, 90) / 10}",
+            f"Hemoglobin A1c: {rng.randint(45, 95) / 10}",
+            f"Obesity Medications: {rng.choice(MEDICATIONS)} {rng.randint(1, 5)} mg ",
+            f"Alcohol: {rng.randint(0, 7)} Servings per week",
+            "Comorbidities:",
+            *comorbidities,
+            "",
+            *BOILERPLATE,
+            "",
+        ]
+    return "\n".join(lines)
+
+
+class FakeEMR:
+    """A search screen that opens a chart; ctrl+a/ctrl+c copy the chart, ctrl+w closes it."""
+
+    def __init__(self, root: tk.Tk, latency: float = 0.0):
+        self.root = root
+        self.latency_ms = int(latency * 1000)
+
+        root.title("Fake EMR")
+        root.geometry(f"{WIDTH}x{HEIGHT}+0+0")
+
+        self.search = tk.Frame(root, width=WIDTH, height=HEIGHT)
+        self.entry = tk.Entry(self.search)
+        self.entry.place(x=300, y=145, width=300, height=30)  # search bar at (450, 160)
+        button = tk.Button(self.search, text="Open Chart", command=self.open_chart)
+        button.place(x=700, y=255, width=120, height=30)  # search result at (760, 270)
+
+        self.chart = tk.Text(root)
+
+        root.bind_all("<Control-a>", self.select_all)
+        root.bind_all("<Control-c>", self.copy)
+        root.bind_all("<Control-w>", self.close_chart)
+        self.close_chart()
+
+    def open_chart(self):
+        mrn = self.entry.get().strip()
+        if mrn:
+            self.root.after(self.latency_ms, self._show_chart, mrn)
+
+    def _show_chart(self, mrn: str):
+        self.search.place_forget()
+        self.chart.delete("1.0", tk.END)
+        self.chart.insert("1.0", synthetic_chart(mrn))
+        self.chart.place(x=0, y=0, width=WIDTH, height=HEIGHT)
+        self.chart.focus_set()
+
+    def select_all(self, _event=None):
+        self.chart.tag_add(tk.SEL, "1.0", tk.END)
+        return "break"
+
+    def copy(self, _event=None):
+        self.root.clipboard_clear()
+        self.root.clipboard_append(self.chart.get("1.0", "end-1c"))
+        return "break"
+
+    def close_chart(self, _event=None):
+        self.chart.place_forget()
+        self.entry.delete(0, tk.END)
+        self.search.place(x=0, y=0, width=WIDTH, height=HEIGHT)
+        return "break"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve synthetic charts like the EMR would.")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds to wait before a chart opens")
+    args = parser.parse_args()
+
+    window = tk.Tk()
+    FakeEMR(window, latency=args.latency)
+    window.mainloop()
@@ -0,0 +1,29 @@
+"""The master Excel sheet of MRNs, kept apart from autogrep_emr so that reading it doesn't
+need pyautogui (which wants a display as soon as it is imported)."""
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, List
+
+if TYPE_CHECKING:
+    from openpyxl.worksheet.worksheet import Worksheet
+
+# MRNs live in column A of the master Excel sheet
+FIRST_ROW = 4
+LAST_ROW = 28
+
+
+def get_mrns(worksheet: Worksheet) -> List[str]:
+    """Returns the patient MRNs listed in the master Excel sheet, skipping empty cells."""
+    mrns = []
+    for cell_index in range(FIRST_ROW, LAST_ROW):
+        value = worksheet[f"A{cell_index}"].value
+        if value is not None and str(value).strip():
+            mrns.append(str(value).strip())
+    return mrns
+
+
+def read_mrns(input_file: str) -> List[str]:
+    """Returns the MRNs in the master Excel sheet saved at input_file."""
+    import openpyxl  # only needed here, the tests run without it
+
+    return get_mrns(openpyxl.load_workbook(input_file)["Sheet1"])
@@ -1,14 +1,49 @@
+import argparse
 import copy
 import csv
+import json
 import os
 import re
 import sys
-from typing import List, Tuple, Iterable, Set
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Deque, Iterator, List, Optional, Tuple, Iterable, Set, TypedDict, Union
+
+from chart_guard import ChartGuard, ChartQuarantined, GuardEvent
+from chart_storage import chart_mrn, iter_charts
+from cohort_stats import CohortStats
 
 
 Visit = List[str]
 Encounters = List[Visit]
 
+# one row of patient_data.csv, the keys are the column names
+Datasheet = TypedDict(
+    "Datasheet",
+    {
+        "MRN": str,
+        "Encounters": int,
+        "Recent Visit Date": str,
+        "Intake Visit Date": str,
+        "Intake WeightLBS": float,
+        "Max WeightLBS": float,
+        "Min WeightLBS": float,
+        "HeightCM": int,
+        "Height_Low_Err": int,
+        "Intake BMI": float,
+        "Max BMI": float,
+        "Min BMI": float,
+        "Smoker": str,
+        "Insurance": str,
+        "Latest Fasting Glucose": float,
+        "Latest A1c%": float,
+        "Comorbidity": str,
+        "Obesity Medications": str,
+        "Latest Alcohol": str,
+    },
+)
+
 
 LBS_PATTERN = re.compile(
     r"\d+\.?\d+\s*lbs"
@@ -126,7 +161,7 @@ def get_alcohol(encounters: Encounters) -> str:
     for row in _yield_from_rows(encounters):
         if row.startswith("Alcohol:"):
             items.append(row)
-        else:
+        elif "alcohol" in row.lower():  # cheap check before the (slow on long lines) pattern
             results = re.findall(ALCOHOL_PATTERN, row)
             items += results
     if items:
@@ -287,74 +322,187 @@ def get_intake_max_min_weights(encounters: Encounters) -> Tuple[float, float, fl
     return intake_weight, max_weight, min_weight
 
 
-def main():
-    """reads text files in the current directory, processes the text data, and stores
-    the extracted information for each patient in a dictionary. The dictionaries are
-    stored in a list, which is then written to a CSV file."""
+def parse_chart(mrn: str, text: str, guard: Optional[ChartGuard] = None) -> Datasheet:
+    """processes the text of one patient's chart and returns the extracted information
+    in a dictionary. If given, the guard's budgets are enforced; a chart over budget
+    raises ChartQuarantined."""
+    guard = guard if guard is not None else ChartGuard.unlimited()
+    started = time.perf_counter()
+    guard.check_size(mrn, text)
+
+    datasheet = {}
+    lines = text.replace("\u200c", "")  # problem introduced in data collection
+    lines = guard.bound_lines(mrn, lines.split("\n"))
+    encounters = guard.watch(mrn, split_into_encounters(lines), started)
+    encounters_count = len(encounters)
+    # start collecting data across the encounters
+    intake_weight, max_weight, min_weight = get_intake_max_min_weights(encounters)
+    height, discrepancy = get_height_and_discrepancy(encounters)
+    guard.check_time(mrn, started, "weights and height")
+
+    recent_date, intake_date = get_recent_intake_dates(lines)
+    datasheet["MRN"] = mrn
+    datasheet["Encounters"] = encounters_count
+    datasheet["Recent Visit Date"] = recent_date
+    datasheet["Intake Visit Date"] = intake_date
+    datasheet["Intake WeightLBS"] = intake_weight
+    datasheet["Max WeightLBS"] = max_weight
+    datasheet["Min WeightLBS"] = min_weight
+    datasheet["HeightCM"] = height
+    datasheet["Height_Low_Err"] = discrepancy
+    datasheet["Intake BMI"] = calculate_bmi(height, intake_weight)
+    datasheet["Max BMI"] = calculate_bmi(height, max_weight)
+    datasheet["Min BMI"] = calculate_bmi(height, min_weight)
+    datasheet["Smoker"] = is_smoker(encounters)
+    datasheet["Insurance"] = has_insurance(encounters) or ""  # has_insurance gives None if there is none
+    datasheet["Latest Fasting Glucose"] = get_fasting_glucose(encounters)
+    datasheet["Latest A1c%"] = get_hemoglobin_a1c(encounters)
+    guard.check_time(mrn, started, "smoker, insurance, glucose and A1c")
+    datasheet["Comorbidity"] = ";".join(get_comorbidity(encounters))
+    datasheet["Obesity Medications"] = get_obesity_medications(encounters)
+    guard.check_time(mrn, started, "comorbidity and medications")
+    datasheet["Latest Alcohol"] = get_alcohol(encounters)
+    guard.check_time(mrn, started, "alcohol")
+    return datasheet
+
+
+def parse_charts(
+    charts: Union[str, Iterable[Tuple[str, str]]],
+    workers: int = 0,
+    stats: Optional[CohortStats] = None,
+    mrn: str = "",
+    guard: Optional[ChartGuard] = None,
+) -> Iterator[Datasheet]:
+    """lazily parses charts held in memory, either one chart's text (named by mrn) or
+    (mrn, text) pairs, and yields a datasheet for each in the same order. With workers > 1
+    the charts are parsed by that many processes, a few charts ahead of what's been yielded.
+    If given, stats is updated with each datasheet as it is yielded, and the guard's budgets
+    are enforced. Charts over budget or that fail to parse are skipped, and recorded in
+    guard.events when a guard is given."""
+    if isinstance(charts, str):
+        charts = [(mrn, charts)]
+    budget = guard if guard is not None else ChartGuard.unlimited()
+    if workers > 1:
+        results = _parse_in_processes(charts, workers, budget)
+    else:
+        results = (_parse_guarded(mrn, text, budget.fresh()) for mrn, text in charts)
+
+    for datasheet, events in results:
+        if guard is not None:
+            guard.events.extend(events)
+        if datasheet is None:
+            continue
+        if stats is not None:
+            stats.update(datasheet)
+        yield datasheet
+
+
+def _parse_guarded(mrn: str, text: str, guard: ChartGuard) -> Tuple[Optional[Datasheet], List[GuardEvent]]:
+    # the guard's events are handed back, a worker process can't add them to the caller's guard
+    try:
+        return parse_chart(mrn, text, guard), guard.events
+    except ChartQuarantined:
+        return None, guard.events
+    except Exception as e:
+        guard.record(mrn, "error", _describe_error(e))
+        return None, guard.events
+
+
+def _parse_in_processes(
+    charts: Iterable[Tuple[str, str]], workers: int, guard: ChartGuard
+) -> Iterator[Tuple[Optional[Datasheet], List[GuardEvent]]]:
+    # only a few charts per worker are in flight, so the charts can come from a queue
+    with ProcessPoolExecutor(workers) as pool:
+        pending: Deque = deque()
+        for mrn, text in charts:
+            pending.append(pool.submit(_parse_guarded, mrn, text, guard.fresh()))
+            if len(pending) >= workers * 4:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _describe_error(e: Exception) -> str:
+    tb = e.__traceback__
+    while tb.tb_next:
+        tb = tb.tb_next
+    lineno = tb.tb_lineno
+    return f"{e} from ln.{e.__traceback__.tb_lineno} that came from: ln.{lineno}"
+
+
+def _read_charts(paths: Iterable[str], guard: ChartGuard) -> Iterator[Tuple[str, str]]:
+    """Yields (mrn, text) for every chart in the paths, recording the ones that can't be read."""
+    for path in paths:
+        try:
+            for file, open_chart in iter_charts(path):
+                mrn = chart_mrn(file)
+                try:
+                    with open_chart() as handle:
+                        text = guard.read(mrn, handle)
+                except ChartQuarantined:
+                    continue  # already recorded by the guard
+                except Exception as e:
+                    guard.record(mrn, "error", f"{file}: {_describe_error(e)}")
+                    continue
+                yield mrn, text
+        except Exception as e:
+            # e.g. a corrupt or truncated archive, keep what was read and move on to the next path
+            print(f"Couldn't read {path}: {e}")
+
+
+def _report_events(guard: ChartGuard, start: int) -> int:
+    for event in guard.events[start:]:
+        if event.event == "quarantined":
+            print(f"Quarantined {event.mrn}: {event.detail}")
+        elif event.event == "error":
+            print(f"Couldn't process {event.mrn}: {event.detail}")
+    return len(guard.events)
+
+
+def main(
+    paths: Iterable[str] = (".",),
+    stats: Optional[CohortStats] = None,
+    guard: Optional[ChartGuard] = None,
+    workers: int = 0,
+):
+    """reads text files (plain or compressed) in the given directories and zip/tar archives,
+    processes the text data, and stores the extracted information for each patient in a
+    dictionary. The dictionaries are stored in a list, which is then written to a CSV file.
+    The charts are parsed by parse_charts(), with that many workers. If given, stats is
+    updated with each dictionary as it is produced, and the guard's budgets are enforced;
+    files over budget or that fail are skipped and recorded in guard.events."""
     datasheets = []
+    guard = guard if guard is not None else ChartGuard.unlimited()
 
-    for file in os.listdir("."):
-        if file.endswith(".txt"):
-            try:
-                datasheet = {}
-                with open(file) as handle:
-
-                    lines = handle.read()
-                    lines = lines.replace(
-                        "\u200c", ""
-                    )  # problem introduced in data collection
-                    lines = lines.split("\n")
-                    encounters = split_into_encounters(lines)
-                    encounters_count = len(encounters)
-                    # start collecting data across the encounters
-                    intake_weight, max_weight, min_weight = get_intake_max_min_weights(
-                        encounters
-                    )
-                    height, discrepancy = get_height_and_discrepancy(encounters)
-
-                    recent_date, intake_date = get_recent_intake_dates(lines)
-                    datasheet["MRN"] = os.path.splitext(file)[0]
-                    datasheet["Encounters"] = encounters_count
-                    datasheet["Recent Visit Date"] = recent_date
-                    datasheet["Intake Visit Date"] = intake_date
-                    datasheet["Intake WeightLBS"] = intake_weight
-                    datasheet["Max WeightLBS"] = max_weight
-                    datasheet["Min WeightLBS"] = min_weight
-                    datasheet["HeightCM"] = height
-                    datasheet["Height_Low_Err"] = discrepancy
-                    datasheet["Intake BMI"] = calculate_bmi(height, intake_weight)
-                    datasheet["Max BMI"] = calculate_bmi(height, max_weight)
-                    datasheet["Min BMI"] = calculate_bmi(height, min_weight)
-                    datasheet["Smoker"] = is_smoker(encounters)
-                    datasheet["Insurance"] = has_insurance(encounters)
-                    datasheet["Latest Fasting Glucose"] = get_fasting_glucose(
-                        encounters
-                    )
-                    datasheet["Latest A1c%"] = get_hemoglobin_a1c(encounters)
-                    datasheet["Comorbidity"] = ";".join(get_comorbidity(encounters))
-                    datasheet["Obesity Medications"] = get_obesity_medications(
-                        encounters
-                    )
-                    datasheet["Latest Alcohol"] = get_alcohol(encounters)
-
-                datasheets.append(copy.deepcopy(datasheet))
-            except Exception as e:
-                tb = e.__traceback__
-                while tb.tb_next:
-                    tb = tb.tb_next
-                lineno = tb.tb_lineno
-                print(
-                    f"Couldn't process {file}: {e} from ln.{e.__traceback__.tb_lineno} that came from: ln.{lineno}"
-                )
+    reported = len(guard.events)
+    charts = _read_charts(paths, guard)
+    for datasheet in parse_charts(charts, workers=workers, stats=stats, guard=guard):
+        datasheets.append(datasheet)
+        reported = _report_events(guard, reported)
+    _report_events(guard, reported)
 
     return datasheets
 
 
 if __name__ == "__main__":
-    datasheets = main()
+    parser = argparse.ArgumentParser(description="Collect patient data from charts into patient_data.csv.")
+    parser.add_argument("paths", nargs="*", default=["."], help="directories and zip/tar archives of charts")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="processes parsing charts")
+    args = parser.parse_args()
+
+    cohort = CohortStats()
+    chart_guard = ChartGuard()
+    datasheets = main(args.paths, stats=cohort, guard=chart_guard, workers=args.workers)
+    if chart_guard.events:
+        with open("guard_events.csv", "w") as handle:
+            w = csv.writer(handle)
+            w.writerow(GuardEvent._fields)
+            w.writerows(chart_guard.events)
     if datasheets:
         with open("patient_data.csv", "w") as handle:
             w = csv.DictWriter(handle, datasheets[0].keys())
             w.writeheader()
             for ds in datasheets:
                 w.writerow(ds)
+        with open("cohort_summary.json", "w") as handle:
+            json.dump(cohort.summary(), handle, indent=2)
@@ -0,0 +1,93 @@
+import importlib.util
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+from autogrep_sessions import HERE, split_mrns, run_sessions, AutoGrepSessionException, VirtualDisplay
+from chart_storage import chart_path, open_chart
+from mrn_sheet import get_mrns
+from fake_emr import synthetic_chart
+from read_patient_data import (
+    split_into_encounters,
+    get_height_and_discrepancy,
+    get_intake_max_min_weights,
+    has_insurance,
+)
+
+
+HAS_DISPLAY_TOOLS = all(shutil.which(tool) for tool in ("Xvfb", "xclip")) and all(
+    importlib.util.find_spec(module) for module in ("pyautogui", "pyperclip", "openpyxl")
+)
+
+
+class TestAutoGrepSessions(unittest.TestCase):
+    def test_split_mrns(self):
+        mrns = ["1", "2", "3", "4", "5"]
+        self.assertEqual(split_mrns(mrns, 1), [mrns])
+        self.assertEqual(split_mrns(mrns, 2), [["1", "3", "5"], ["2", "4"]])
+        # more sessions than MRNs leaves the extra sessions out
+        self.assertEqual(split_mrns(["1", "2"], 4), [["1"], ["2"]])
+
+    def test_split_mrns_needs_a_session(self):
+        with self.assertRaises(AutoGrepSessionException):
+            split_mrns(["1"], 0)
+
+    def test_synthetic_chart_is_stable(self):
+        self.assertEqual(synthetic_chart("123456"), synthetic_chart("123456"))
+        self.assertNotEqual(synthetic_chart("123456"), synthetic_chart("654321"))
+
+    def test_synthetic_chart_parses(self):
+        encounters = split_into_encounters(synthetic_chart("123456", visits=3).split("\n"))
+        assert len(encounters) == 3
+
+        height, discrepancy = get_height_and_discrepancy(encounters)
+        assert 150 <= height <= 195
+        assert discrepancy == 0
+
+        intake_weight, max_weight, min_weight = get_intake_max_min_weights(encounters)
+        assert max_weight == intake_weight + 20
+        assert 0 < min_weight <= intake_weight
+        assert has_insurance(encounters)
+
+    def _fake_xvfb(self, folder: str, script: str) -> dict:
+        # stands in for Xvfb, which is called as: Xvfb -displayfd FD ...
+        path = os.path.join(folder, "Xvfb")
+        with open(path, "w") as handle:
+            handle.write(f"#!{sys.executable}\nimport os, sys, time\n{script}")
+        os.chmod(path, 0o755)
+        return {"PATH": folder + os.pathsep + os.environ.get("PATH", "")}
+
+    def test_virtual_display_uses_display_from_xvfb(self):
+        with tempfile.TemporaryDirectory() as folder:
+            env = self._fake_xvfb(folder, "os.write(int(sys.argv[2]), b'42\\n')\ntime.sleep(30)\n")
+            with mock.patch.dict(os.environ, env):
+                with VirtualDisplay() as display:
+                    self.assertEqual(display.name, ":42")
+                    self.assertEqual(display.env()["DISPLAY"], ":42")
+                    process = display.process
+                self.assertIsNotNone(process.poll())  # stopped on exit
+
+    def test_virtual_display_xvfb_fails(self):
+        with tempfile.TemporaryDirectory() as folder:
+            env = self._fake_xvfb(folder, "sys.exit(1)\n")  # e.g. no free display
+            with mock.patch.dict(os.environ, env):
+                with self.assertRaises(AutoGrepSessionException):
+                    VirtualDisplay(timeout=5.0).__enter__()
+
+    def test_get_mrns_skips_empty_cells(self):
+        cells = {"A4": 123, "A5": None, "A6": " ", "A27": "456 ", "A28": 789}
+        worksheet = {f"A{i}": SimpleNamespace(value=cells.get(f"A{i}")) for i in range(1, 30)}
+        self.assertEqual(get_mrns(worksheet), ["123", "456"])
+
+    @unittest.skipUnless(HAS_DISPLAY_TOOLS, "needs Xvfb, xclip, pyautogui, pyperclip and openpyxl")
+    def test_run_sessions_against_fake_emr(self):
+        mrns = ["100001", "100002", "100003"]
+        emr_command = [sys.executable, os.path.join(HERE, "fake_emr.py")]
+        with tempfile.TemporaryDirectory() as folder:
+            run_sessions(mrns, 2, emr_command=emr_command, pause_scale=0.2, output_dir=folder)
+            for mrn in mrns:
+                with open_chart(os.path.join(folder, chart_path(mrn))) as handle:
+                    self.assertEqual(handle.read(), synthetic_chart(mrn))
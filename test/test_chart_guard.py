@@ -0,0 +1,78 @@
+import io
+import time
+import unittest
+from chart_guard import ChartGuard, ChartQuarantined, GuardEvent
+from read_patient_data import get_alcohol, parse_chart, parse_charts
+
+CHART = "ID: 1\nVisit Date: 2023-02-01\nHeight: 170cm\nInsurance: Aetna\n"
+
+
+class TestChartGuard(unittest.TestCase):
+    def test_bound_lines(self):
+        guard = ChartGuard(max_line_chars=5)
+        self.assertEqual(guard.bound_lines("1", ["short", "too long"]), ["short", "too l"])
+        self.assertEqual(guard.events, [GuardEvent("1", "line truncated", "line 2 had 8 characters")])
+
+    def test_unlimited_changes_nothing(self):
+        guard = ChartGuard.unlimited()
+        self.assertEqual(parse_chart("1", CHART, guard), parse_chart("1", CHART))
+        self.assertEqual(guard.events, [])
+
+    def test_read_stops_at_max_chars(self):
+        guard = ChartGuard(max_chars=10)
+        self.assertEqual(guard.read("1", io.StringIO("0123456789")), "0123456789")
+        with self.assertRaises(ChartQuarantined):
+            guard.read("2", io.StringIO("0123456789X"))
+        self.assertEqual([(e.mrn, e.event) for e in guard.events], [("2", "quarantined")])
+
+    def test_time_budget(self):
+        guard = ChartGuard(max_seconds=0.0)
+        with self.assertRaises(ChartQuarantined):
+            parse_chart("1", CHART, guard)
+        self.assertEqual(guard.events[0].event, "quarantined")
+        self.assertIn("weights and height", guard.events[0].detail)
+
+    def test_pathological_medication_line(self):
+        # a long run of spaces makes MED_PATTERN quadratic, the guard keeps it bounded
+        chart = "Obesity Medications:" + " " * 50_000 + "x\n" + CHART
+        guard = ChartGuard()
+        datasheet = parse_chart("1", chart, guard)
+        self.assertEqual(datasheet["HeightCM"], 170)
+        self.assertEqual(guard.events[0].event, "line truncated")
+
+    def test_time_budget_stops_a_slow_extractor(self):
+        # every line is under the length cap, but each one is slow for MED_PATTERN
+        line = "Obesity Medications:" + " " * 1975
+        chart = CHART + "\n".join([line] * 100)
+        guard = ChartGuard(max_seconds=0.5)
+        with self.assertRaises(ChartQuarantined):
+            parse_chart("1", chart, guard)
+        # stopped part way through an extractor, not after it
+        self.assertEqual(guard.events[-1].event, "quarantined")
+        self.assertIn("scanning rows", guard.events[-1].detail)
+
+    def test_watch_leaves_ordinary_visits_alone(self):
+        guard = ChartGuard()
+        short, long = ["ID: 1", "Height: 170cm"], ["ID: 2", "x" * 1000]
+        watched = guard.watch("1", [short, long], time.perf_counter())
+        self.assertIs(watched[0], short)
+        self.assertIsNot(watched[1], long)
+        self.assertEqual(list(watched[1]), long)
+
+    def test_parse_charts_skips_quarantined(self):
+        guard = ChartGuard(max_chars=len(CHART))
+        charts = [("1", CHART), ("2", CHART + "extra"), ("3", CHART)]
+        for workers in (0, 2):
+            guard.events.clear()
+            mrns = [ds["MRN"] for ds in parse_charts(charts, workers=workers, guard=guard)]
+            self.assertEqual(mrns, ["1", "3"])
+            self.assertEqual([(e.mrn, e.event) for e in guard.events], [("2", "quarantined")])
+
+    def test_get_alcohol_unchanged(self):
+        patterns = [
+            [[["Alcohol: 2 servings"]], "Alcohol: 2 servings"],
+            [[["Drinks ALCOHOL on weekends."]], "Drinks ALCOHOL on weekends."],
+            [[["No mention of drinking."]], "0 Servings"],
+        ]
+        for group, expected in patterns:
+            self.assertEqual(get_alcohol(group), expected)
@@ -0,0 +1,106 @@
+import gzip
+import io
+import os
+import tarfile
+import tempfile
+import unittest
+import zipfile
+from chart_storage import (
+    CHART_SUFFIX,
+    chart_mrn,
+    chart_path,
+    is_chart,
+    iter_charts,
+    open_chart,
+)
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CHART = "ID: 1\nVisit Date: 2023-01-01\nIntake Weight: 250 lbs\n" * 50
+
+
+class TestChartStorage(unittest.TestCase):
+    def test_chart_mrn(self):
+        patterns = [
+            ["123.txt", "123"],
+            ["123.txt.gz", "123"],
+            ["123.txt.xz", "123"],
+            ["123.txt.zst", "123"],
+            [os.path.join("charts", "123.txt.bz2"), "123"],
+        ]
+        for path, expected in patterns:
+            self.assertEqual(chart_mrn(path), expected)
+
+    def test_is_chart(self):
+        assert is_chart("123.txt")
+        assert is_chart("123.txt.gz")
+        assert is_chart(chart_path("123"))
+        assert not is_chart("patient_data.csv")
+        assert not is_chart("123.gz")
+
+    def test_round_trip(self):
+        with tempfile.TemporaryDirectory() as folder:
+            for suffix in (".txt", ".txt.gz", ".txt.xz", ".txt.bz2", CHART_SUFFIX):
+                path = os.path.join(folder, chart_path("123", suffix))
+                with open_chart(path, "w") as handle:
+                    handle.write(CHART)
+                with open_chart(path) as handle:
+                    self.assertEqual(handle.read(), CHART)
+
+    def test_default_is_compressed(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, chart_path("123"))
+            with open_chart(path, "w") as handle:
+                handle.write(CHART)
+            assert os.path.getsize(path) < len(CHART) / 10
+
+    @unittest.skipUnless(zstandard, "zstandard is not installed")
+    def test_zstd_round_trip(self):
+        self.assertEqual(CHART_SUFFIX, ".txt.zst")
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, chart_path("123"))
+            with open_chart(path, "w") as handle:
+                handle.write(CHART)
+            with open(path, "rb") as handle:
+                self.assertEqual(zstandard.ZstdDecompressor().stream_reader(handle).read(), CHART.encode())
+            with open_chart(path) as handle:
+                self.assertEqual(handle.read(), CHART)
+
+    def test_not_a_chart(self):
+        with self.assertRaises(ValueError):
+            open_chart("patient_data.csv")
+
+    def test_iter_charts_in_archives(self):
+        charts = {"111.txt": CHART, "charts/222.txt.gz": CHART, "notes.csv": "skipped"}
+        with tempfile.TemporaryDirectory() as folder:
+            zip_path = os.path.join(folder, "charts.zip")
+            tar_path = os.path.join(folder, "charts.tar.gz")
+            with zipfile.ZipFile(zip_path, "w") as archive:
+                for name, text in charts.items():
+                    data = text.encode()
+                    archive.writestr(name, gzip.compress(data) if name.endswith(".gz") else data)
+            with tarfile.open(tar_path, "w:gz") as archive:
+                for name, text in charts.items():
+                    data = text.encode()
+                    data = gzip.compress(data) if name.endswith(".gz") else data
+                    info = tarfile.TarInfo(name)
+                    info.size = len(data)
+                    archive.addfile(info, io.BytesIO(data))
+
+            for path in (zip_path, tar_path):
+                found = {}
+                for name, open_member in iter_charts(path):
+                    with open_member() as handle:
+                        found[chart_mrn(name)] = handle.read()
+                self.assertEqual(found, {"111": CHART, "222": CHART})
+
+    def test_iter_charts_in_directory(self):
+        with tempfile.TemporaryDirectory() as folder:
+            for name in ("111.txt", "222.txt.xz", "notes.csv"):
+                with open(os.path.join(folder, name), "w"):
+                    pass
+            names = sorted(name for name, _ in iter_charts(folder))
+            self.assertEqual(names, ["111.txt", "222.txt.xz"])
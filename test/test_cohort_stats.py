@@ -0,0 +1,127 @@
+import random
+import statistics
+import unittest
+from collections import Counter
+from cohort_stats import CohortStats, QuantileSketch, RunningStats, TopCounter, a1c_bucket
+
+
+class TestCohortStats(unittest.TestCase):
+    def test_running_stats(self):
+        rng = random.Random(1)
+        values = [rng.uniform(15, 60) for _ in range(500)]
+        stats = RunningStats()
+        for value in values:
+            stats.add(value)
+        self.assertAlmostEqual(stats.mean, statistics.mean(values))
+        self.assertAlmostEqual(stats.variance, statistics.variance(values))
+        self.assertEqual(stats.min, min(values))
+        self.assertEqual(stats.max, max(values))
+
+    def test_running_stats_merge(self):
+        rng = random.Random(2)
+        values = [rng.uniform(15, 60) for _ in range(300)]
+        left, right = RunningStats(), RunningStats()
+        for value in values[:100]:
+            left.add(value)
+        for value in values[100:]:
+            right.add(value)
+        left.merge(right)
+        left.merge(RunningStats())  # empty merges change nothing
+        self.assertEqual(left.count, 300)
+        self.assertAlmostEqual(left.mean, statistics.mean(values))
+        self.assertAlmostEqual(left.variance, statistics.variance(values))
+
+    def test_quantile_sketch(self):
+        rng = random.Random(3)
+        values = sorted(rng.uniform(15, 60) for _ in range(1001))
+        left, right = QuantileSketch(0.01), QuantileSketch(0.01)
+        for i, value in enumerate(values):
+            (left if i % 2 else right).add(value)
+        left.merge(right)
+        for q in (0.05, 0.5, 0.95):
+            expected = values[round(q * 1000)]
+            self.assertAlmostEqual(left.quantile(q), expected, delta=expected * 0.02)
+        self.assertEqual(QuantileSketch().quantile(0.5), 0.0)
+
+    def test_quantile_sketch_positive_only(self):
+        with self.assertRaises(ValueError):
+            QuantileSketch().add(0.0)
+
+    def test_top_counter_is_bounded(self):
+        counter = TopCounter(capacity=10)
+        for i in range(10_000):
+            counter.add("frequent" if i % 3 == 0 else f"one-off {i}")
+        self.assertLessEqual(len(counter.counts), 10)
+        value, count = counter.most_common(1)[0]
+        self.assertEqual(value, "frequent")
+        self.assertGreaterEqual(count, 3334)  # never under-counted
+
+    def test_top_counter_merge(self):
+        left, right = TopCounter(capacity=3), TopCounter(capacity=3)
+        left.update(["a", "a", "b", "c"])
+        right.update(["a", "d", "d", "e"])
+        left.merge(right)
+        self.assertLessEqual(len(left.counts), 3)
+        # both sides were full, so d may have been evicted from the left and is credited with its smallest count
+        self.assertEqual(left.counts["a"], 3)
+        self.assertEqual(left.counts["d"], 3)
+
+    def test_top_counter_merge_never_under_counts(self):
+        left, right = TopCounter(capacity=2), TopCounter(capacity=2)
+        left.update("xyyzz")  # x is evicted here
+        right.update("xxxxx")
+        left.merge(right)
+        self.assertGreaterEqual(left.counts["x"], 6)
+
+    def test_top_counter_merge_bound(self):
+        rng = random.Random(4)
+        stream = [f"v{min(int(rng.expovariate(0.3)), 50)}" for _ in range(3000)]
+        capacity = 10
+        counters = [TopCounter(capacity) for _ in range(3)]
+        for i, value in enumerate(stream):
+            counters[i % 3].add(value)
+        merged = counters[0]
+        merged.merge(counters[1])
+        merged.merge(counters[2])
+
+        true_counts = Counter(stream)
+        for value, count in merged.counts.items():
+            # over-counted by at most len(stream) / capacity
+            self.assertGreaterEqual(count, true_counts[value])
+            self.assertLessEqual(count, true_counts[value] + len(stream) / capacity)
+        # anything seen more than 1/capacity of the time is kept
+        for value, count in true_counts.items():
+            if count > len(stream) / capacity:
+                self.assertIn(value, merged.counts)
+
+    def test_a1c_bucket(self):
+        patterns = [
+            [0.0, "Not Recorded"],
+            [5.6, "Normal (<5.7)"],
+            [5.7, "Prediabetes (5.7-6.4)"],
+            [6.5, "Diabetes (>=6.5)"],
+        ]
+        for a1c, expected in patterns:
+            self.assertEqual(a1c_bucket(a1c), expected)
+
+    def test_cohort_update_and_merge(self):
+        sheets = [
+            {"Intake BMI": 30.0, "Latest A1c%": 6.0, "Smoker": "no", "Insurance": "Aetna",
+             "Comorbidity": "GERD;Hypertension"},
+            {"Intake BMI": 40.0, "Latest A1c%": 0.0, "Smoker": "no", "Insurance": None,
+             "Comorbidity": "GERD"},
+        ]
+        left, right = CohortStats(), CohortStats()
+        left.update(sheets[0])
+        right.update(sheets[1])
+        left.merge(right)
+
+        summary = left.summary()
+        self.assertEqual(summary["Patients"], 2)
+        self.assertEqual(summary["Intake BMI"]["Count"], 2)
+        self.assertEqual(summary["Intake BMI"]["Mean"], 35.0)
+        self.assertEqual(summary["Latest A1c%"]["Count"], 1)  # zero is not recorded
+        self.assertEqual(summary["Smoker"], {"no": 2})
+        self.assertEqual(summary["Insurance"], {"Aetna": 1, "Not Recorded": 1})
+        self.assertEqual(summary["A1c Buckets"], {"Prediabetes (5.7-6.4)": 1, "Not Recorded": 1})
+        self.assertEqual(summary["Comorbidity"], {"GERD": 2, "Hypertension": 1})
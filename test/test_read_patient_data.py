@@ -1,5 +1,16 @@
+import contextlib
+import io
+import os
+import tarfile
+import tempfile
 import unittest
+import zipfile
+from chart_guard import ChartGuard
+from fake_emr import synthetic_chart
 from read_patient_data import (
+    main,
+    parse_chart,
+    parse_charts,
     get_intake_max_min_weights,
     has_insurance,
     get_fasting_glucose,
@@ -201,3 +212,78 @@ class TestReadPatientData(unittest.TestCase):
         self.assertEquals(
             calculate_bmi(height, weight), 0.0
         )  # all zeros should result in zeros.
+
+    def test_main_reads_archive(self):
+        chart = "ID: 1\nVisit Date: 2023-02-01\nHeight: 170cm\nInsurance: Aetna\n"
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "charts.zip")
+            with zipfile.ZipFile(path, "w") as archive:
+                archive.writestr("site/123.txt", chart)
+            datasheets = main([path])
+        self.assertEqual(len(datasheets), 1)
+        self.assertEqual(datasheets[0]["MRN"], "123")
+        self.assertEqual(datasheets[0]["HeightCM"], 170)
+        self.assertEqual(datasheets[0]["Insurance"], "Aetna")
+
+    def test_main_skips_bad_paths(self):
+        with tempfile.TemporaryDirectory() as folder:
+            good = os.path.join(folder, "good.zip")
+            with zipfile.ZipFile(good, "w") as archive:
+                archive.writestr("123.txt", synthetic_chart("123"))
+            bad = os.path.join(folder, "bad.tar.gz")
+            with tarfile.open(bad, "w:gz") as archive:
+                for mrn in range(20):
+                    data = synthetic_chart(str(mrn)).encode()
+                    info = tarfile.TarInfo(f"{mrn}.txt")
+                    info.size = len(data)
+                    archive.addfile(info, io.BytesIO(data))
+            with open(bad, "rb") as handle:
+                data = handle.read()
+            with open(bad, "wb") as handle:
+                handle.write(data[: len(data) // 2])  # truncated in transit
+            typo = os.path.join(folder, "goood.zip")
+
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                datasheets = main([good, bad, typo])
+        self.assertIn("123", [ds["MRN"] for ds in datasheets])
+        self.assertIn(f"Couldn't read {bad}", output.getvalue())
+        self.assertIn(f"Couldn't read {typo}", output.getvalue())
+
+    def test_parse_charts_single_text(self):
+        chart = "ID: 1\nVisit Date: 2023-02-01\nHeight: 170cm\n"
+        datasheets = list(parse_charts(chart, mrn="123"))
+        self.assertEqual(len(datasheets), 1)
+        self.assertEqual(datasheets[0], parse_chart("123", chart))
+        self.assertEqual(datasheets[0]["Insurance"], "")  # a str even when there's none
+
+    def test_parse_charts_is_lazy(self):
+        def charts():
+            yield "1", synthetic_chart("1")
+            raise AssertionError("read past the first chart")
+
+        datasheets = parse_charts(charts())
+        self.assertEqual(next(datasheets)["MRN"], "1")
+
+    def test_parse_charts_in_processes(self):
+        charts = [(str(mrn), synthetic_chart(str(mrn))) for mrn in range(20)]
+        serial = list(parse_charts(charts))
+        self.assertEqual(list(parse_charts(iter(charts), workers=2)), serial)
+        self.assertEqual([ds["MRN"] for ds in serial], [mrn for mrn, _ in charts])
+
+    def test_parse_charts_skips_errors(self):
+        charts = [("1", synthetic_chart("1")), ("2", "Visit Date:\n"), ("3", synthetic_chart("3"))]
+        for workers in (0, 2):
+            guard = ChartGuard.unlimited()
+            mrns = [ds["MRN"] for ds in parse_charts(charts, workers=workers, guard=guard)]
+            self.assertEqual(mrns, ["1", "3"])
+            self.assertEqual([(e.mrn, e.event) for e in guard.events], [("2", "error")])
+
+    def test_main_with_workers(self):
+        with tempfile.TemporaryDirectory() as folder:
+            for mrn in ("1", "2", "3"):
+                with open(os.path.join(folder, f"{mrn}.txt"), "w") as handle:
+                    handle.write(synthetic_chart(mrn))
+            serial = main([folder])
+            self.assertEqual(main([folder], workers=2), serial)
+        self.assertEqual(sorted(ds["MRN"] for ds in serial), ["1", "2", "3"])